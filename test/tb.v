@@ -30,10 +30,16 @@ module tb ();
         .clk(clk),
         .rst_n(rst_n)
     );
+
+    // Done flag as a 1-bit net so tests can await its rising edge
+    wire done = uo_out[4];
     
-    // Dump waves
+    // Dump waves (override the file with +DUMPFILE=<name>, e.g. per shard)
+    reg [8*64-1:0] dumpfile;
     initial begin
-        $dumpfile("tb.vcd");
+        if (!$value$plusargs("DUMPFILE=%s", dumpfile))
+            dumpfile = "tb.vcd";
+        $dumpfile(dumpfile);
         $dumpvars(0, tb);
     end
 
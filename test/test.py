@@ -7,84 +7,231 @@ Tests the complete wrapper with parallel streaming protocol (Option B):
 - Checks timing (~3,940 cycles)
 """
 
+import os
+from collections import namedtuple
 from pathlib import Path
 
 import cocotb
 import numpy as np
 from cocotb.clock import Clock
-from cocotb.triggers import ClockCycles, RisingEdge
+from cocotb.triggers import ClockCycles, First, RisingEdge
+from cocotb.utils import get_sim_time
 
 # Path to test vectors
 VECTOR_DIR = Path(__file__).parent / "test_vectors" / "vectors"
 
+CLOCK_PERIOD_NS = 10
 
-def load_test_vector(test_idx):
-    """Load a test vector (just pixels and expected output)."""
-    # Load input pixels
-    input_file = VECTOR_DIR / f"test_{test_idx:03d}_input.txt"
-    pixels = []
-    with open(input_file, "r") as f:
-        for line in f:
-            line = line.strip()
-            if line and not line.startswith("#"):
-                pixels.append(int(line))
-    assert len(pixels) == 64, f"Expected 64 pixels, got {len(pixels)}"
+# Max cycles to sleep between done checks while waiting for inference
+DONE_POLL_CYCLES = 256
 
-    # Load expected output
+# A failed vector in the multi-inference test; got is "TIMEOUT" on timeout
+Failure = namedtuple("Failure", "idx expected got cycles")
+
+# Number of vectors covered by the multi-inference test (split across shards)
+NUM_MULTI_VECTORS = 10
+
+# Parsed test vectors keyed by test index, filled on first use of each
+_VECTORS = {}
+
+
+def _parse_shard(spec):
+    """
+    Parse a COCOTB_VECTOR_SHARD spec of the form "index/count".
+
+    count may not exceed NUM_MULTI_VECTORS, so every shard gets a vector.
+    """
+    index, _, count = spec.partition("/")
+    index, count = int(index), int(count)
+    if not 0 <= index < count <= NUM_MULTI_VECTORS:
+        raise ValueError(f"Invalid COCOTB_VECTOR_SHARD: {spec!r}")
+    return index, count
+
+
+# Optional sharding of the multi-vector test across parallel simulator runs,
+# e.g. COCOTB_VECTOR_SHARD=1/4 runs every 4th vector starting at index 1
+SHARD_INDEX, SHARD_COUNT = _parse_shard(os.environ.get("COCOTB_VECTOR_SHARD", "0/1"))
+
+
+def pack_pixels(pixels):
+    """Pack 64 2-bit pixels into 16 ui_in bytes (pixel 0 in bits [1:0])."""
+    p = np.asarray(pixels, dtype=np.uint8).reshape(16, 4)
+    return (p[:, 3] << 6) | (p[:, 2] << 4) | (p[:, 1] << 2) | p[:, 0]
+
+
+def _parse_test_vector(test_idx):
+    """
+    Parse one test vector from its text files.
+
+    Pixels are packed into ui_in bytes here, so the returned tuple is
+    (packed, expected, metadata) with packed a uint8[16] array.
+    """
+    input_file = VECTOR_DIR / f"test_{test_idx:03d}_input.txt"
     output_file = VECTOR_DIR / f"test_{test_idx:03d}_output.txt"
-    with open(output_file, "r") as f:
-        for line in f:
-            line = line.strip()
-            if line and not line.startswith("#"):
-                expected = int(line)
-                break
-
-    # Load metadata
     metadata_file = VECTOR_DIR / f"test_{test_idx:03d}_metadata.txt"
-    metadata = {}
-    with open(metadata_file, "r") as f:
-        for line in f:
-            line = line.strip()
-            if ":" in line:
-                key, value = line.split(":", 1)
-                metadata[key.strip()] = value.strip()
 
-    return pixels, expected, metadata
+    # Load input pixels
+    pixels = np.loadtxt(input_file, comments="#", dtype=np.uint8)
+    assert pixels.shape == (64,), f"Expected 64 pixels, got shape {pixels.shape}"
+    packed = pack_pixels(pixels)
+
+    # Load expected output
+    expected = int(np.loadtxt(output_file, comments="#", dtype=np.int64))
+
+    # Load metadata ("key: value" lines)
+    metadata = {
+        key.strip(): value.strip()
+        for line in metadata_file.read_text().splitlines()
+        for key, sep, value in [line.partition(":")]
+        if sep
+    }
+
+    return packed, expected, metadata
+
+
+def _load_all():
+    """Parse every test vector in VECTOR_DIR and keep them in memory."""
+    for input_file in sorted(VECTOR_DIR.glob("test_*_input.txt")):
+        load_test_vector(int(input_file.name[5:8]))
+    return _VECTORS
+
+
+def load_test_vector(test_idx):
+    """Load a test vector (packed ui_in bytes and expected output)."""
+    if test_idx not in _VECTORS:
+        _VECTORS[test_idx] = _parse_test_vector(test_idx)
+    return _VECTORS[test_idx]
 
 
-async def stream_pixels_parallel(dut, pixels):
+async def stream_packed(dut, packed, start=0):
     """
-    Stream 64 pixels using parallel protocol (4 pixels per cycle).
+    Stream pixels using parallel protocol (4 pixels per cycle).
 
     Args:
         dut: Device under test
-        pixels: List of 64 pixel values (2-bit each, 0-3)
+        packed: 16 packed ui_in bytes (see pack_pixels)
+        start: Index of the first packed byte to drive
 
     Returns:
         Number of cycles used for streaming
     """
-    assert len(pixels) == 64, "Must provide exactly 64 pixels"
+    assert len(packed) == 16, "Must provide exactly 16 packed bytes"
 
     cycles = 0
 
-    # Stream 16 cycles of 4 pixels each
-    for i in range(16):
-        # Pack 4 pixels into ui_in[7:0]
-        pixel_0 = pixels[i * 4 + 0]
-        pixel_1 = pixels[i * 4 + 1]
-        pixel_2 = pixels[i * 4 + 2]
-        pixel_3 = pixels[i * 4 + 3]
-
-        ui_in_value = (pixel_3 << 6) | (pixel_2 << 4) | (pixel_1 << 2) | pixel_0
-        dut.ui_in.value = ui_in_value
-
+    # One packed byte (4 pixels) per cycle
+    for ui_in_value in packed[start:]:
+        dut.ui_in.value = int(ui_in_value)
         await RisingEdge(dut.clk)
         cycles += 1
 
     return cycles
 
 
-@cocotb.test()
+def cycles_since(start_ns):
+    """Whole clock cycles elapsed since simulation time start_ns."""
+    return round((get_sim_time("ns") - start_ns) / CLOCK_PERIOD_NS)
+
+
+async def wait_for_done(dut, max_cycles, start_ns=None):
+    """
+    Wait for the done flag (uo_out[4]) until max_cycles have elapsed.
+
+    Sleeps in DONE_POLL_CYCLES chunks raced against a rising edge on done,
+    so Python only wakes a handful of times per inference.
+
+    When done rises mid-chunk the wait continues to the next clock edge, so
+    uo_out is read with settled values and the count matches a per-edge
+    polling loop (which first sees done on the edge after it is set).
+
+    Args:
+        dut: Device under test
+        max_cycles: Cycle budget, counted from start_ns
+        start_ns: Simulation time to count from (defaults to now)
+
+    Returns:
+        Cycles elapsed since start_ns (>= max_cycles on timeout)
+    """
+    if start_ns is None:
+        start_ns = get_sim_time("ns")
+
+    cycles = cycles_since(start_ns)
+    while not (int(dut.uo_out.value) & 0x10) and cycles < max_cycles:
+        chunk = min(DONE_POLL_CYCLES, max_cycles - cycles)
+        await First(ClockCycles(dut.clk, chunk), RisingEdge(dut.done))
+        if int(dut.uo_out.value) & 0x10:
+            # Woken inside the update that sets done; let outputs settle
+            await RisingEdge(dut.clk)
+        cycles = cycles_since(start_ns)
+
+    return cycles
+
+
+async def log_progress(dut, start_ns, interval=500):
+    """Log a heartbeat every `interval` cycles, counted from start_ns."""
+    while True:
+        await ClockCycles(dut.clk, interval)
+        dut._log.info("  Cycle %d: Still computing...", cycles_since(start_ns))
+
+
+async def run_inference(dut, packed, max_cycles, verbose=False):
+    """
+    Reset the DUT and run one inference with the parallel streaming protocol.
+
+    The clock must already be running with ena high and start low. Leaves
+    start asserted so the result stays on uo_out; callers clear it when done.
+
+    Args:
+        dut: Device under test
+        packed: 16 packed ui_in bytes (see pack_pixels)
+        max_cycles: Cycle budget from start to done
+        verbose: Log each protocol step at INFO instead of DEBUG, plus a
+            progress heartbeat while waiting
+
+    Returns:
+        (result, cycle_count) tuple; cycle_count >= max_cycles on timeout
+    """
+    log = dut._log.info if verbose else dut._log.debug
+
+    # Reset
+    dut.rst_n.value = 0
+    await ClockCycles(dut.clk, 2)
+    dut.rst_n.value = 1
+    await ClockCycles(dut.clk, 1)
+
+    # Cycles are counted from here using simulation time
+    start_ns = get_sim_time("ns")
+    progress = cocotb.start_soon(log_progress(dut, start_ns)) if verbose else None
+
+    try:
+        # Set first 4 pixels on ui_in BEFORE asserting start
+        dut.ui_in.value = int(packed[0])
+
+        # Assert start signal (pixels stay on ui_in)
+        log("Starting inference (asserting start with first pixels ready)...")
+        dut.uio_in.value = 0x01  # start = 1
+        await RisingEdge(dut.clk)
+
+        # MNIST enters LOAD_PIXELS this cycle and will latch first 4 pixels
+        # DON'T change ui_in yet - MNIST needs another cycle to read them
+        await RisingEdge(dut.clk)
+
+        # Now stream remaining pixels (15 more cycles, 4 pixels each)
+        log("Streaming remaining 60 pixels (15 cycles, 4 pixels/cycle)...")
+        await stream_packed(dut, packed, start=1)
+
+        # Wait for done signal
+        log("Waiting for computation to complete...")
+        cycle_count = await wait_for_done(dut, max_cycles, start_ns)
+    finally:
+        if progress is not None:
+            progress.cancel()
+
+    result = int(dut.uo_out.value) & 0x0F  # Lower 4 bits = prediction
+    return result, cycle_count
+
+
+@cocotb.test(skip=SHARD_INDEX != 0)
 async def test_wrapper_single_inference(dut):
     """Test wrapper with a single inference (detailed logging)."""
 
@@ -93,84 +240,39 @@ async def test_wrapper_single_inference(dut):
     dut._log.info("=" * 80)
 
     # Start clock
-    clock = Clock(dut.clk, 10, unit="ns")
+    clock = Clock(dut.clk, CLOCK_PERIOD_NS, unit="ns")
     cocotb.start_soon(clock.start())
 
-    # Load test vector
-    pixels, expected, metadata = load_test_vector(0)
-
-    dut._log.info(f"Test Vector: 0")
-    dut._log.info(f"True Label: {metadata.get('True label', '?')}")
-    dut._log.info(f"Expected Prediction: {expected}")
-
-    # Reset
+    # Idle inputs are set once; run_inference only drives rst_n/ui_in/start
     dut.ena.value = 1
     dut.ui_in.value = 0
     dut.uio_in.value = 0
-    dut.rst_n.value = 0
-    await ClockCycles(dut.clk, 2)
-    dut.rst_n.value = 1
-    await RisingEdge(dut.clk)
-
-    cycle_count = 0
-
-    # Set first 4 pixels on ui_in BEFORE asserting start
-    pixel_0 = pixels[0]
-    pixel_1 = pixels[1]
-    pixel_2 = pixels[2]
-    pixel_3 = pixels[3]
-    ui_in_value = (pixel_3 << 6) | (pixel_2 << 4) | (pixel_1 << 2) | pixel_0
-    dut.ui_in.value = ui_in_value
 
-    # Assert start signal (pixels stay on ui_in)
-    dut._log.info("Starting inference (asserting start with first pixels ready)...")
-    dut.uio_in.value = 0x01  # start = 1
-    await RisingEdge(dut.clk)
-    cycle_count += 1
+    # Load test vector
+    packed, expected, metadata = load_test_vector(0)
 
-    # MNIST enters LOAD_PIXELS this cycle and will latch first 4 pixels
-    # DON'T change ui_in yet - MNIST needs another cycle to read them
-    await RisingEdge(dut.clk)
-    cycle_count += 1
-
-    # Now stream remaining pixels (15 more cycles, 4 pixels each)
-    dut._log.info("Streaming remaining 60 pixels (15 cycles, 4 pixels/cycle)...")
-    for i in range(1, 16):
-        pixel_0 = pixels[i * 4 + 0]
-        pixel_1 = pixels[i * 4 + 1]
-        pixel_2 = pixels[i * 4 + 2]
-        pixel_3 = pixels[i * 4 + 3]
-        ui_in_value = (pixel_3 << 6) | (pixel_2 << 4) | (pixel_1 << 2) | pixel_0
-        dut.ui_in.value = ui_in_value
-        await RisingEdge(dut.clk)
-        cycle_count += 1
+    dut._log.info("Test Vector: %d", 0)
+    dut._log.info("True Label: %s", metadata.get("True label", "?"))
+    dut._log.info("Expected Prediction: %s", expected)
 
-    # Wait for done signal
-    dut._log.info("Waiting for computation to complete...")
     max_cycles = 5000
-    while dut.uo_out.value[4] != 1 and cycle_count < max_cycles:  # Check done bit
-        await RisingEdge(dut.clk)
-        cycle_count += 1
-
-        if cycle_count % 500 == 0:
-            dut._log.info(f"  Cycle {cycle_count}: Still computing...")
+    result, cycle_count = await run_inference(dut, packed, max_cycles, verbose=True)
 
     if cycle_count >= max_cycles:
-        dut._log.error(f"TIMEOUT: No done signal after {max_cycles} cycles")
+        dut._log.error("TIMEOUT: No done signal after %d cycles", max_cycles)
         assert False, "Inference timed out"
 
     # Read result
     uo_out_val = int(dut.uo_out.value)
-    result = uo_out_val & 0x0F  # Lower 4 bits = prediction
     done = bool(uo_out_val & 0x10)  # Bit 4 = done
     busy = bool(uo_out_val & 0x20)  # Bit 5 = busy
 
     dut._log.info("Inference complete!")
-    dut._log.info(f"Total Cycles: {cycle_count}")
-    dut._log.info(f"Expected:     {expected}")
-    dut._log.info(f"Got:          {result}")
-    dut._log.info(f"Done signal:  {done}")
-    dut._log.info(f"Busy signal:  {busy}")
+    dut._log.info("Total Cycles: %d", cycle_count)
+    dut._log.info("Expected:     %s", expected)
+    dut._log.info("Got:          %s", result)
+    dut._log.info("Done signal:  %s", done)
+    dut._log.info("Busy signal:  %s", busy)
 
     if result == expected:
         dut._log.info("✓ PASS")
@@ -188,83 +290,49 @@ async def test_wrapper_multiple_inferences(dut):
     """Test wrapper with multiple inferences."""
 
     dut._log.info("=" * 80)
-    dut._log.info("TT Wrapper - Multiple Inference Test (10 vectors)")
+    dut._log.info(
+        "TT Wrapper - Multiple Inference Test (%d vectors)", NUM_MULTI_VECTORS
+    )
     dut._log.info("=" * 80)
 
     # Start clock
-    clock = Clock(dut.clk, 10, unit="ns")
+    clock = Clock(dut.clk, CLOCK_PERIOD_NS, unit="ns")
     cocotb.start_soon(clock.start())
 
-    num_vectors = 10
+    # Idle inputs are set once; run_inference only drives rst_n/ui_in/start
+    dut.ena.value = 1
+    dut.ui_in.value = 0
+    dut.uio_in.value = 0
+
+    test_indices = range(SHARD_INDEX, NUM_MULTI_VECTORS, SHARD_COUNT)
+    num_vectors = len(test_indices)
+    max_cycles = 5000
     num_pass = 0
     num_fail = 0
     failures = []
     cycle_counts = []
 
-    for test_idx in range(num_vectors):
-        # Load test vector
-        pixels, expected, metadata = load_test_vector(test_idx)
-
-        # Reset
-        dut.ena.value = 1
-        dut.ui_in.value = 0
-        dut.uio_in.value = 0
-        dut.rst_n.value = 0
-        await ClockCycles(dut.clk, 2)
-        dut.rst_n.value = 1
-        await RisingEdge(dut.clk)
-
-        cycle_count = 0
-
-        # Set first 4 pixels on ui_in BEFORE asserting start
-        pixel_0 = pixels[0]
-        pixel_1 = pixels[1]
-        pixel_2 = pixels[2]
-        pixel_3 = pixels[3]
-        ui_in_value = (pixel_3 << 6) | (pixel_2 << 4) | (pixel_1 << 2) | pixel_0
-        dut.ui_in.value = ui_in_value
-
-        # Start inference
-        dut.uio_in.value = 0x01
-        await RisingEdge(dut.clk)
-        cycle_count += 1
+    if SHARD_COUNT > 1:
+        dut._log.info(
+            "Shard %d/%d: vectors %s", SHARD_INDEX, SHARD_COUNT, list(test_indices)
+        )
 
-        # Hold first pixels for MNIST to latch
-        await RisingEdge(dut.clk)
-        cycle_count += 1
-
-        # Stream remaining pixels
-        for i in range(1, 16):
-            pixel_0 = pixels[i * 4 + 0]
-            pixel_1 = pixels[i * 4 + 1]
-            pixel_2 = pixels[i * 4 + 2]
-            pixel_3 = pixels[i * 4 + 3]
-            ui_in_value = (pixel_3 << 6) | (pixel_2 << 4) | (pixel_1 << 2) | pixel_0
-            dut.ui_in.value = ui_in_value
-            await RisingEdge(dut.clk)
-            cycle_count += 1
+    for test_idx in test_indices:
+        # Load test vector
+        packed, expected, metadata = load_test_vector(test_idx)
 
-        # Wait for done
-        max_cycles = 5000
-        while dut.uo_out.value[4] != 1 and cycle_count < max_cycles:
-            await RisingEdge(dut.clk)
-            cycle_count += 1
+        result, cycle_count = await run_inference(dut, packed, max_cycles)
 
         if cycle_count >= max_cycles:
-            dut._log.error(f"Test {test_idx}: TIMEOUT")
+            dut._log.error("Test %d: TIMEOUT", test_idx)
             num_fail += 1
-            failures.append(
-                {
-                    "idx": test_idx,
-                    "expected": expected,
-                    "got": "TIMEOUT",
-                    "cycles": cycle_count,
-                }
-            )
+            failures.append(Failure(test_idx, expected, "TIMEOUT", cycle_count))
+            # run_inference no longer zeroes uio_in during reset, so clear
+            # start here or the next vector would start with it still high
+            dut.uio_in.value = 0x00
             continue
 
         # Check result
-        result = int(dut.uo_out.value) & 0x0F
         cycle_counts.append(cycle_count)
 
         if result == expected:
@@ -273,19 +341,16 @@ async def test_wrapper_multiple_inferences(dut):
         else:
             num_fail += 1
             status = "✗"
-            failures.append(
-                {
-                    "idx": test_idx,
-                    "expected": expected,
-                    "got": result,
-                    "cycles": cycle_count,
-                }
-            )
+            failures.append(Failure(test_idx, expected, result, cycle_count))
 
-        true_label = metadata.get("True label", "?")
         dut._log.info(
-            f"{status} Test {test_idx:2d}: Label={true_label}, "
-            f"Expected={expected}, Got={result}, Cycles={cycle_count}"
+            "%s Test %2d: Label=%s, Expected=%s, Got=%s, Cycles=%s",
+            status,
+            test_idx,
+            metadata.get("True label", "?"),
+            expected,
+            result,
+            cycle_count,
         )
 
         # Clear start
@@ -302,20 +367,31 @@ async def test_wrapper_multiple_inferences(dut):
 
     dut._log.info("=" * 80)
     dut._log.info(
-        f"RESULTS: {num_pass}/{num_vectors} tests passed ({100 * num_pass / num_vectors:.1f}%)"
+        "RESULTS: %d/%d tests passed (%.1f%%)",
+        num_pass,
+        num_vectors,
+        100 * num_pass / num_vectors,
     )
     if cycle_counts:
         dut._log.info(
-            f"Cycle Stats: Min={min_cycles}, Max={max_cycles}, Avg={avg_cycles:.1f}"
+            "Cycle Stats: Min=%d, Max=%d, Avg=%.1f",
+            min_cycles,
+            max_cycles,
+            avg_cycles,
         )
     dut._log.info("=" * 80)
 
     if num_fail > 0:
-        dut._log.error(f"FAILURES: {num_fail} tests failed")
+        dut._log.error("FAILURES: %d tests failed", num_fail)
         for f in failures:
             dut._log.error(
-                f"Test {f['idx']:2d}: Expected {f['expected']}, Got {f['got']}"
+                "Test %2d: Expected %s, Got %s", f.idx, f.expected, f.got
             )
         assert False, f"{num_fail}/{num_vectors} tests failed"
     else:
         dut._log.info("✓ ALL TESTS PASSED!")
+
+
+# Opt-in: parse all vectors at import instead of on first use
+if os.environ.get("COCOTB_PRELOAD_VECTORS") == "1":
+    _load_all()